@@ -1,3 +1,3 @@
-from imgtowebp.core import convert_image, SUPPORTED_EXTENSIONS, DEFAULT_QUALITY
+from imgtowebp.core import convert_image, SUPPORTED_EXTENSIONS, DEFAULT_QUALITY, DEFAULT_METHOD, MAX_PIXELS
 
 __version__ = "0.1.0"
@@ -1,17 +1,27 @@
 import argparse
+import logging
+import logging.handlers
+import os
 import sys
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Deque, Iterable, List, Tuple
 
 # Handle both direct execution and package import
 try:
     from .core import (
         SUPPORTED_EXTENSIONS,
+        BACKENDS,
         DEFAULT_QUALITY,
+        DEFAULT_METHOD,
         convert_image,
         format_bytes,
     )
+    from .gpu import gpu_available
+    from .index import ConversionIndex
 except ImportError:
     # If relative import fails, add src directory to path
     current_dir = Path(__file__).parent
@@ -20,35 +30,111 @@ except ImportError:
     sys.path.insert(0, str(src_dir))
     from imgtowebp.core import (
         SUPPORTED_EXTENSIONS,
+        BACKENDS,
         DEFAULT_QUALITY,
+        DEFAULT_METHOD,
         convert_image,
         format_bytes,
     )
+    from imgtowebp.gpu import gpu_available
+    from imgtowebp.index import ConversionIndex
 
-@dataclass
+log = logging.getLogger("imgtowebp")
+
+# Files per task sent to a worker process
+BATCH_SIZE = 8
+
+@dataclass(slots=True)
 class ConversionStats:
     scanned: int = 0
     eligible: int = 0
     converted: int = 0
     skipped_existing: int = 0
+    skipped_compressed: int = 0
     deleted_originals: int = 0
     failed: int = 0
     total_input_bytes: int = 0
     total_output_bytes: int = 0
     total_deleted_bytes: int = 0
 
-def iter_images(directory: Path, recursive: bool) -> Iterable[Path]:
-    iterator = directory.rglob("*") if recursive else directory.glob("*")
-    for path in iterator:
-        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
-            yield path
+@dataclass(slots=True)
+class FileResult:
+    """Outcome of converting a single file, returned from worker processes."""
+    status: str
+    input_bytes: int = 0
+    output_bytes: int = 0
+    deleted: bool = False
+    deleted_bytes: int = 0
+    output_path: str | None = None
+    messages: List[str] = field(default_factory=list)
+
+def iter_images(
+    directory: str | Path, recursive: bool, stats: ConversionStats | None = None
+) -> Iterable[Tuple[str, os.stat_result]]:
+    """
+    Walk directory with os.scandir so file/dir checks use the cached d_type
+    instead of a stat() per entry. Counts every file seen into stats.scanned.
+    Yields each image with its stat result so callers never re-stat the source.
+    Paths are plain strings; building a Path per file is measurable on big trees.
+    """
+    try:
+        scanner = os.scandir(directory)
+    except OSError as e:
+        # Skip unreadable directories, as Path.rglob did, instead of aborting the run
+        log.warning(f"Skipped directory {directory}: {e}")
+        return
+
+    # List the whole directory before yielding anything: conversions write
+    # .webp files next to their sources, and a still-open scan would pick
+    # them up mid-run and inflate stats.scanned.
+    images = []
+    subdirs = []
+    with scanner as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subdirs.append(entry.path)
+                continue
+            if not entry.is_file():
+                continue
+            if stats is not None:
+                stats.scanned += 1
+            if os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                images.append((entry.path, entry.stat()))
+
+    yield from images
+
+    # Recurse only after closing the handle, so at most one directory fd is open
+    for subdir in subdirs:
+        yield from iter_images(subdir, recursive, stats)
+
+def setup_logging() -> None:
+    """
+    Send per-file log lines to stdout through a memory buffer, so a large
+    batch does a handful of writes instead of one per file.
+    """
+    if log.handlers:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    buffered = logging.handlers.MemoryHandler(
+        capacity=1024, flushLevel=logging.CRITICAL, target=stream
+    )
+    log.addHandler(buffered)
+    log.setLevel(logging.INFO)
+    log.propagate = False
 
 def print_summary(stats: ConversionStats) -> None:
+    for handler in log.handlers:
+        handler.flush()
+
     print("\nSummary:")
     print(f"  Scanned files: {stats.scanned}")
     print(f"  Eligible images: {stats.eligible}")
     print(f"  Converted: {stats.converted}")
     print(f"  Skipped (existing webp): {stats.skipped_existing}")
+    print(f"  Skipped (already compressed JPEG): {stats.skipped_compressed}")
     print(f"  Deleted originals: {stats.deleted_originals}")
     print(f"  Failed: {stats.failed}")
 
@@ -65,13 +151,242 @@ def print_summary(stats: ConversionStats) -> None:
     if stats.deleted_originals > 0:
         print(f"  Deleted bytes (originals): {format_bytes(stats.total_deleted_bytes)}")
 
+def convert_one(
+    src_path: str,
+    src_size: int,
+    quality: int,
+    overwrite: bool,
+    replace: bool,
+    method: int = DEFAULT_METHOD,
+    lossless: bool = False,
+    skip_compressed_jpeg: bool = False,
+    max_dimension: int | None = None,
+    backend: str = "cpu",
+    known_converted: bool = False,
+    max_pixels: int | None = None,
+) -> FileResult:
+    """
+    Convert a single image next to its source.
+    Pure with respect to shared state so it can run in a worker process;
+    log lines are buffered on the result and printed by the caller.
+    known_converted marks a source the index says is already converted.
+    """
+    dst_path = os.path.splitext(src_path)[0] + ".webp"
+    src_name = os.path.basename(src_path)
+
+    # Settle "already converted" with one lstat before the source is opened;
+    # convert_image is then told to overwrite so it doesn't check again.
+    if known_converted or (not overwrite and os.path.lexists(dst_path)):
+        result = FileResult("skipped_existing")
+        deleted_label = "Deleted original (WebP exists)"
+    else:
+        res = convert_image(
+            src_path,
+            dst_path,
+            quality=quality,
+            overwrite=True,
+            method=method,
+            lossless=lossless,
+            input_size=src_size,
+            skip_compressed_jpeg=skip_compressed_jpeg,
+            max_dimension=max_dimension,
+            backend=backend,
+            max_pixels=max_pixels,
+        )
+
+        if res.skipped:
+            # Nothing was written, so the original is kept even with --replace
+            result = FileResult("skipped_compressed")
+            result.messages.append(f"Skipped {src_name}: {res.message}")
+            return result
+
+        if not res.success:
+            result = FileResult("failed")
+            result.messages.append(f"Failed {src_name}: {res.message}")
+            return result
+
+        result = FileResult("converted", res.input_size, res.output_size, output_path=dst_path)
+        if res.warning:
+            result.messages.append(f"Warning ({src_name}): {res.warning}")
+        result.messages.append(f"Converted: {src_name} -> {os.path.basename(dst_path)}")
+        deleted_label = "Deleted original"
+
+    # If we want to replace even if webp already exists
+    if replace:
+        # lexists also matches a dangling symlink; never drop the only copy
+        if result.status == "skipped_existing" and not os.path.exists(dst_path):
+            result.messages.append(
+                f"Kept original {src_name}: {os.path.basename(dst_path)} is a dangling symlink"
+            )
+            return result
+        try:
+            os.unlink(src_path)
+            result.deleted = True
+            result.deleted_bytes = src_size
+            result.messages.append(f"{deleted_label}: {src_name}")
+        except Exception as e:
+            result.messages.append(f"Failed to delete {src_name}: {e}")
+
+    return result
+
+def convert_to_webp(
+    images: Iterable[Tuple[str, os.stat_result]],
+    stats: ConversionStats,
+    quality: int = DEFAULT_QUALITY,
+    overwrite: bool = False,
+    replace: bool = False,
+    workers: int | None = None,
+    method: int = DEFAULT_METHOD,
+    lossless: bool = False,
+    skip_compressed_jpeg: bool = False,
+    max_dimension: int | None = None,
+    backend: str = "cpu",
+    incremental: bool = False,
+    max_pixels: int | None = None,
+) -> None:
+    """
+    Convert images as the walk produces them, fanning out across processes,
+    and accumulate into stats. Batches are submitted while the directory
+    walk continues, with a bounded number in flight for backpressure.
+    With incremental, sources recorded as converted in the on-disk index
+    (and unchanged since) are treated as already converted.
+    """
+    worker = partial(
+        convert_one,
+        quality=quality,
+        overwrite=overwrite,
+        replace=replace,
+        method=method,
+        lossless=lossless,
+        skip_compressed_jpeg=skip_compressed_jpeg,
+        max_dimension=max_dimension,
+        backend=backend,
+        max_pixels=max_pixels,
+    )
+    workers = workers or os.cpu_count() or 1
+    index = None
+    if incremental:
+        # Everything that changes the encoded output; other runs don't count as current
+        settings = f"quality={quality};method={method};lossless={lossless};max_dimension={max_dimension}"
+        index = ConversionIndex(settings=settings)
+
+    try:
+        if workers == 1:
+            for path, st in images:
+                stats.eligible += 1
+                known = index is not None and index.is_current(path, st)
+                result = worker(path, st.st_size, known_converted=known)
+                _accumulate([(path, st, result)], stats, index)
+            return
+
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight: Deque[Tuple["Future[List[FileResult]]", List[Tuple[str, os.stat_result]]]] = deque()
+            # Output stems owned by submitted, not yet accounted batches. Sources
+            # sharing a stem (s1.jpg, s1.png -> s1.webp) must not run in parallel,
+            # so a clashing source waits until the earlier batch is accounted for.
+            claimed: set[str] = set()
+            batch: List[Tuple[str, os.stat_result]] = []
+
+            def drain_oldest() -> None:
+                future, done = in_flight.popleft()
+                for path, _ in done:
+                    claimed.discard(_output_stem(path))
+                _accumulate(_zip_results(done, future.result()), stats, index)
+
+            def submit(batch: List[Tuple[str, os.stat_result]]) -> None:
+                claimed.update(_output_stem(path) for path, _ in batch)
+                in_flight.append(_submit_batch(executor, worker, batch, index))
+
+            for path, st in images:
+                stats.eligible += 1
+                stem = _output_stem(path)
+                while stem in claimed:
+                    drain_oldest()
+                # Same-stem sources within one batch run in order in one worker
+                batch.append((path, st))
+                if len(batch) < BATCH_SIZE:
+                    continue
+                submit(batch)
+                batch = []
+                while len(in_flight) >= max_in_flight:
+                    drain_oldest()
+
+            if batch:
+                submit(batch)
+            while in_flight:
+                drain_oldest()
+    finally:
+        if index is not None:
+            index.close()
+
+def _output_stem(path: str) -> str:
+    return os.path.normcase(os.path.splitext(path)[0])
+
+def _submit_batch(
+    executor: ProcessPoolExecutor,
+    worker: Callable[..., FileResult],
+    batch: List[Tuple[str, os.stat_result]],
+    index: ConversionIndex | None,
+) -> Tuple["Future[List[FileResult]]", List[Tuple[str, os.stat_result]]]:
+    # Index lookups stay in the parent; workers only get what they need
+    items = [
+        (path, st.st_size, index is not None and index.is_current(path, st))
+        for path, st in batch
+    ]
+    return executor.submit(_convert_batch, worker, items), batch
+
+def _convert_batch(
+    worker: Callable[..., FileResult], batch: List[Tuple[str, int, bool]]
+) -> List[FileResult]:
+    return [worker(path, size, known_converted=known) for path, size, known in batch]
+
+def _zip_results(
+    batch: List[Tuple[str, os.stat_result]], results: List[FileResult]
+) -> Iterable[Tuple[str, os.stat_result, FileResult]]:
+    return ((path, st, result) for (path, st), result in zip(batch, results))
+
+def _accumulate(
+    done: Iterable[Tuple[str, os.stat_result, FileResult]],
+    stats: ConversionStats,
+    index: ConversionIndex | None = None,
+) -> None:
+    for src_path, st, result in done:
+        for message in result.messages:
+            log.info(message)
+
+        if result.status == "converted":
+            stats.converted += 1
+            stats.total_input_bytes += result.input_bytes
+            stats.total_output_bytes += result.output_bytes
+            if index is not None and not result.deleted and result.output_path:
+                index.record(src_path, st, result.output_path)
+        elif result.status == "skipped_existing":
+            stats.skipped_existing += 1
+        elif result.status == "skipped_compressed":
+            stats.skipped_compressed += 1
+        else:
+            stats.failed += 1
+
+        if result.deleted:
+            stats.deleted_originals += 1
+            stats.total_deleted_bytes += result.deleted_bytes
+
 def run_cli() -> None:
     parser = argparse.ArgumentParser(description="Batch convert images to WebP.")
     parser.add_argument("--dir", default=".", help="Target directory (default: current).")
     parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY, help=f"Quality 0-100 (default: {DEFAULT_QUALITY}).")
+    parser.add_argument("--method", type=int, default=DEFAULT_METHOD, help=f"Encoder effort 0 (fast) - 6 (smallest) (default: {DEFAULT_METHOD}).")
+    parser.add_argument("--lossless", action="store_true", help="Encode losslessly (quality then controls compression effort).")
+    parser.add_argument("--skip-compressed-jpeg", action="store_true", help="Leave JPEGs already saved at or near the target quality unconverted.")
+    parser.add_argument("--max-dimension", type=int, default=None, help="Downscale images so neither side exceeds this many pixels.")
+    parser.add_argument("--backend", choices=BACKENDS, default="cpu", help="Decode backend; 'gpu' decodes JPEGs with NVIDIA nvImageCodec (default: cpu).")
+    parser.add_argument("--incremental", action="store_true", help="Skip sources unchanged since their last conversion (index in ~/.cache/imgtowebp).")
+    parser.add_argument("--max-pixels", type=int, default=None, help="Fail images with more pixels than this without decoding them (default: no limit beyond Pillow's own).")
     parser.add_argument("--no-recursive", action="store_true", help="Do not scan subdirectories.")
     parser.add_argument("--overwrite", action="store_true", help="Overwrite existing .webp files.")
     parser.add_argument("--replace", action="store_true", help="Delete original image after conversion.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
     
     args = parser.parse_args()
     directory = Path(args.dir).resolve()
@@ -80,52 +395,43 @@ def run_cli() -> None:
         print("Error: --quality must be between 0 and 100", file=sys.stderr)
         sys.exit(1)
 
-    stats = ConversionStats()
-    # Simple scanned count for all files in directory
-    stats.scanned = len([f for f in directory.iterdir() if f.is_file()])
+    if not (0 <= args.method <= 6):
+        print("Error: --method must be between 0 and 6", file=sys.stderr)
+        sys.exit(1)
 
-    for src_path in iter_images(directory, not args.no_recursive):
-        stats.eligible += 1
-        dst_path = src_path.with_suffix(".webp")
+    if args.max_pixels is not None and args.max_pixels < 1:
+        print("Error: --max-pixels must be at least 1", file=sys.stderr)
+        sys.exit(1)
 
-        res = convert_image(
-            src_path,
-            dst_path,
-            quality=args.quality,
-            overwrite=args.overwrite
-        )
+    if args.max_dimension is not None and args.max_dimension < 1:
+        print("Error: --max-dimension must be at least 1", file=sys.stderr)
+        sys.exit(1)
 
-        if res.success:
-            stats.converted += 1
-            stats.total_input_bytes += res.input_size
-            stats.total_output_bytes += res.output_size
-            print(f"Converted: {src_path.name} -> {dst_path.name}")
-            
-            if args.replace:
-                try:
-                    src_size = src_path.stat().st_size
-                    src_path.unlink()
-                    stats.deleted_originals += 1
-                    stats.total_deleted_bytes += src_size
-                    print(f"Deleted original: {src_path.name}")
-                except Exception as e:
-                    print(f"Failed to delete {src_path.name}: {e}")
-        else:
-            if "exists" in res.message:
-                stats.skipped_existing += 1
-                # If we want to replace even if webp already exists
-                if args.replace:
-                    try:
-                        src_size = src_path.stat().st_size
-                        src_path.unlink()
-                        stats.deleted_originals += 1
-                        stats.total_deleted_bytes += src_size
-                        print(f"Deleted original (WebP exists): {src_path.name}")
-                    except Exception as e:
-                        print(f"Failed to delete {src_path.name}: {e}")
-            else:
-                stats.failed += 1
-                print(f"Failed {src_path.name}: {res.message}")
+    if args.backend == "gpu" and not gpu_available():
+        print("Error: --backend gpu requires nvImageCodec (pip install imgtowebp[gpu])", file=sys.stderr)
+        sys.exit(1)
+
+    if args.workers is not None and args.workers < 1:
+        print("Error: --workers must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    setup_logging()
+    stats = ConversionStats()
+    convert_to_webp(
+        iter_images(directory, not args.no_recursive, stats),
+        stats,
+        quality=args.quality,
+        overwrite=args.overwrite,
+        replace=args.replace,
+        workers=args.workers,
+        method=args.method,
+        lossless=args.lossless,
+        skip_compressed_jpeg=args.skip_compressed_jpeg,
+        max_dimension=args.max_dimension,
+        backend=args.backend,
+        incremental=args.incremental,
+        max_pixels=args.max_pixels,
+    )
 
     print_summary(stats)
 
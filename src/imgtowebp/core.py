@@ -1,65 +1,239 @@
 import io
+import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO
 from PIL import Image
 
 SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+# Decode backends: "gpu" decodes JPEGs with nvImageCodec (see imgtowebp.gpu)
+BACKENDS = ("cpu", "gpu")
 DEFAULT_QUALITY = 80
+# libwebp effort 0 (fast) - 6 (slowest); 4 is libwebp's own default speed/size tradeoff
+DEFAULT_METHOD = 4
+# Pixel cap the web handler applies to untrusted uploads (see convert_image's max_pixels)
+MAX_PIXELS = 40_000_000
+# A JPEG within this many quality points of the target gains nothing from re-encoding
+JPEG_QUALITY_MARGIN = 5
 
-@dataclass
+# libjpeg's standard luminance quantization table (quality 50)
+_STD_LUMINANCE_QTABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+_STD_LUMINANCE_SUM = sum(_STD_LUMINANCE_QTABLE)
+
+OUTPUT_EXISTS_MESSAGE = "Output file already exists and overwrite is disabled."
+
+@dataclass(slots=True)
 class ConversionResult:
     success: bool
     message: str
     input_size: int = 0
     output_size: int = 0
     saved_bytes: int = 0
+    skipped: bool = False
+    warning: str | None = None
+
+# WebP target mode for the common PIL modes; anything else falls back to getbands()
+_MODE_TO_TARGET = {
+    "RGB": "RGB",
+    "RGBA": "RGBA",
+    "LA": "RGBA",
+    "PA": "RGBA",
+    "P": "RGB",
+    "L": "RGB",
+    "CMYK": "RGB",
+    "I": "RGB",
+    "F": "RGB",
+    "1": "RGB",
+}
 
 def ensure_webp_compatible_mode(img: Image.Image) -> Image.Image:
     """Ensure the image is in a mode compatible with WebP (RGB or RGBA)."""
-    if img.mode in ("RGB", "RGBA"):
+    target = _MODE_TO_TARGET.get(img.mode)
+    if target is None:
+        target = "RGBA" if "A" in img.getbands() else "RGB"
+    if target == img.mode:
         return img
-    if "A" in img.getbands():
-        return img.convert("RGBA")
-    return img.convert("RGB")
+    return img.convert(target)
+
+_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+def estimate_jpeg_quality(img: Image.Image) -> int | None:
+    """
+    Estimate the quality a JPEG was saved with by comparing its luminance
+    quantization table to libjpeg's reference table (inverse of libjpeg's
+    quality scaling). Returns None if the image carries no tables.
+    """
+    tables = getattr(img, "quantization", None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / _STD_LUMINANCE_SUM
+    if scale <= 100:
+        return round((200 - scale) / 2)
+    return round(5000 / scale)
+
+def write_file(path: str | Path, data: bytes | memoryview) -> int:
+    """Write data to path with raw os.write calls, skipping Python's buffered IO layer."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+    except BaseException:
+        # A truncated .webp would later pass for a finished conversion
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+# Per-process GPU state: a failure before any success means the GPU stack
+# itself is unusable, so later files go straight to the CPU path
+_gpu_has_worked = False
+_gpu_disabled = False
+
+def _decode_on_gpu(
+    input_data: bytes | str | Path | BinaryIO,
+) -> tuple[Image.Image | None, str | None]:
+    """
+    Decode a JPEG source with nvImageCodec. Returns (None, warning) to keep the
+    CPU path, where warning explains a GPU failure so callers can surface it.
+    """
+    global _gpu_has_worked, _gpu_disabled
+    if _gpu_disabled:
+        return None, None
+
+    from .gpu import decode_jpeg
+
+    try:
+        if isinstance(input_data, (str, Path)):
+            with open(input_data, "rb") as f:
+                data = f.read()
+        elif isinstance(input_data, (bytes, bytearray)):
+            data = bytes(input_data)
+        else:
+            input_data.seek(0)
+            data = input_data.read()
+        img = decode_jpeg(data)
+    except Exception as e:
+        if not _gpu_has_worked:
+            _gpu_disabled = True
+            return None, f"GPU decode unavailable, using CPU from now on: {e}"
+        return None, f"GPU decode failed, used CPU: {e}"
+
+    _gpu_has_worked = True
+    return img, None
 
 def format_bytes(num_bytes: int) -> str:
     """Format bytes into a human-readable string."""
-    units = ["B", "KB", "MB", "GB", "TB"]
-    size = float(num_bytes)
-    for unit in units:
-        if size < 1024.0 or unit == units[-1]:
-            if unit == "B":
-                return f"{int(size)} {unit}"
-            return f"{size:.2f} {unit}"
-        size /= 1024.0
-    return f"{num_bytes} B"
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    # Each unit is 2**10 of the previous one, so the bit length picks it directly
+    i = min(len(_UNITS) - 1, (num_bytes.bit_length() - 1) // 10)
+    return f"{num_bytes / (1 << (10 * i)):.2f} {_UNITS[i]}"
 
 def convert_image(
-    input_data: bytes | Path,
-    output_path: Path,
+    input_data: bytes | str | Path | BinaryIO,
+    output_path: str | Path,
     quality: int = DEFAULT_QUALITY,
     overwrite: bool = False,
+    method: int = DEFAULT_METHOD,
+    lossless: bool = False,
+    input_size: int | None = None,
+    max_pixels: int | None = None,
+    skip_compressed_jpeg: bool = False,
+    max_dimension: int | None = None,
+    backend: str = "cpu",
 ) -> ConversionResult:
     """
     Core image conversion logic.
-    Supports both file paths and raw bytes as input.
+    Supports file paths, raw bytes and seekable binary streams as input;
+    streams are decoded in place rather than copied into memory first.
+    Pass input_size when the caller already has it (e.g. from a directory scan)
+    to avoid statting or seeking the source again.
+    With max_pixels, larger images are refused from their header, before any
+    decode; PIL's own decompression-bomb limit still applies either way.
+    With skip_compressed_jpeg, JPEGs already saved at or near the target
+    quality are left alone (result.skipped) instead of being re-encoded.
+    max_dimension downscales the output to fit within a square of that size.
+    backend="gpu" decodes JPEGs on the GPU, falling back to PIL on any error.
     """
-    if output_path.exists() and not overwrite:
-        return ConversionResult(False, "Output file already exists and overwrite is disabled.")
+    # lexists: a single lstat, and a dangling symlink still counts as taken
+    if not overwrite and os.path.lexists(output_path):
+        return ConversionResult(False, OUTPUT_EXISTS_MESSAGE)
 
     try:
-        if isinstance(input_data, Path):
-            input_size = input_data.stat().st_size
+        if isinstance(input_data, (str, Path)):
+            if input_size is None:
+                input_size = os.stat(input_data).st_size
             img = Image.open(input_data)
-        else:
+        elif isinstance(input_data, (bytes, bytearray)):
             input_size = len(input_data)
             img = Image.open(io.BytesIO(input_data))
+        else:
+            if input_size is None:
+                input_size = input_data.seek(0, os.SEEK_END)
+                input_data.seek(0)
+            img = Image.open(input_data)
 
         with img:
-            img = ensure_webp_compatible_mode(img)
-            img.save(output_path, "WEBP", quality=quality, method=6)
+            width, height = img.size
+            if max_pixels is not None and width * height > max_pixels:
+                return ConversionResult(
+                    False, f"Image too large: {width}x{height} exceeds {max_pixels} pixels."
+                )
+
+            if skip_compressed_jpeg and img.format == "JPEG":
+                source_quality = estimate_jpeg_quality(img)
+                if source_quality is not None and source_quality <= quality + JPEG_QUALITY_MARGIN:
+                    return ConversionResult(
+                        False,
+                        f"Already compressed (JPEG quality ~{source_quality}).",
+                        input_size=input_size,
+                        skipped=True,
+                    )
+
+            downscale = bool(max_dimension) and max(width, height) > max_dimension
+
+            # thumbnail()'s draft-mode CPU decode of a downscaled JPEG beats a
+            # full-size GPU decode plus copy, so the GPU only takes full-size ones
+            warning = None
+            if backend == "gpu" and img.format == "JPEG" and not downscale:
+                gpu_img, warning = _decode_on_gpu(input_data)
+                if gpu_img is not None:
+                    img.close()
+                    img = gpu_img
+
+            if downscale:
+                # thumbnail() first drafts JPEGs so libjpeg decodes at 1/2, 1/4
+                # or 1/8 scale (kept >= 2x the target for resampling quality)
+                img.thumbnail((max_dimension, max_dimension))
+
+            webp_img = ensure_webp_compatible_mode(img)
+            if webp_img is not img:
+                # Free the decoded source before encoding so only one
+                # full-size pixel buffer is alive while libwebp runs
+                img.close()
+            # Encode fully in memory first: a failed encode never touches the
+            # output path, and the size is known without a stat()
+            buffer = io.BytesIO()
+            webp_img.save(buffer, "WEBP", quality=quality, method=method, lossless=lossless)
+
+        encoded = buffer.getbuffer()
+        output_size = write_file(output_path, encoded)
 
-        output_size = output_path.stat().st_size
         saved_bytes = input_size - output_size
         
         return ConversionResult(
@@ -67,7 +241,8 @@ def convert_image(
             message="Successfully converted",
             input_size=input_size,
             output_size=output_size,
-            saved_bytes=saved_bytes
+            saved_bytes=saved_bytes,
+            warning=warning,
         )
     except Exception as e:
         return ConversionResult(False, f"Error during conversion: {str(e)}")
@@ -0,0 +1,38 @@
+"""
+Optional GPU JPEG decoding through NVIDIA nvImageCodec.
+
+Install with `pip install imgtowebp[gpu]`. nvImageCodec has no WebP encoder,
+so only the decode moves to the GPU; the RGB result is copied back and
+encoded by libwebp on the CPU as usual.
+"""
+import importlib.util
+
+from PIL import Image
+
+# One decoder per process; worker processes each create their own on first use
+_decoder = None
+_decode_params = None
+
+def gpu_available() -> bool:
+    """Return True if nvImageCodec is importable, without initialising CUDA."""
+    try:
+        return importlib.util.find_spec("nvidia.nvimgcodec") is not None
+    except ModuleNotFoundError:
+        return False
+
+def decode_jpeg(data: bytes) -> Image.Image:
+    """Decode JPEG bytes on the GPU and return the pixels as an RGB PIL image."""
+    global _decoder, _decode_params
+    import numpy as np
+    from nvidia import nvimgcodec
+
+    if _decoder is None:
+        _decoder = nvimgcodec.Decoder()
+        # PIL's path ignores EXIF orientation; match it so both backends
+        # produce the same output for rotated JPEGs
+        _decode_params = nvimgcodec.DecodeParams(apply_exif_orientation=False)
+
+    decoded = _decoder.decode(data, params=_decode_params)
+    if decoded is None:
+        raise ValueError("nvImageCodec could not decode the image")
+    return Image.fromarray(np.asarray(decoded.cpu()))
@@ -0,0 +1,71 @@
+"""
+On-disk record of finished conversions, used by the CLI's --incremental mode
+to skip sources that have not changed since they were last converted.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+def default_index_path() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(cache_home) / "imgtowebp" / "index.sqlite"
+
+class ConversionIndex:
+    """
+    Maps each source (path, size, mtime_ns) to the .webp it produced, that
+    file's mtime_ns and the encode settings used. A source only counts as
+    current when it was converted with the same settings as this run, so
+    changing e.g. --quality re-encodes it. New entries are buffered and
+    written in one transaction on close(), so a batch costs a single commit
+    instead of one per file.
+    """
+
+    def __init__(self, path: Path | None = None, settings: str = "") -> None:
+        path = path or default_index_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._settings = settings
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            "src TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "out TEXT, out_mtime_ns INTEGER, settings TEXT)"
+        )
+        self._pending: list[tuple[str, int, int, str, int, str]] = []
+
+    def is_current(self, src: str, st: os.stat_result) -> bool:
+        """
+        True if src is unchanged, was converted with this run's settings and
+        the .webp recorded for it is untouched.
+        """
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, out, out_mtime_ns, settings FROM conversions WHERE src = ?",
+            (src,),
+        ).fetchone()
+        if row is None:
+            return False
+
+        size, mtime_ns, out, out_mtime_ns, settings = row
+        if size != st.st_size or mtime_ns != st.st_mtime_ns or settings != self._settings:
+            return False
+        try:
+            return os.stat(out).st_mtime_ns == out_mtime_ns
+        except OSError:
+            return False
+
+    def record(self, src: str, st: os.stat_result, out: str) -> None:
+        try:
+            out_mtime_ns = os.stat(out).st_mtime_ns
+        except OSError:
+            return
+        self._pending.append(
+            (src, st.st_size, st.st_mtime_ns, out, out_mtime_ns, self._settings)
+        )
+
+    def close(self) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._conn.close()
+        self._pending = []
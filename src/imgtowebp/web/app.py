@@ -1,8 +1,10 @@
 import argparse
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO
 
 from flask import Flask, render_template, request
 from werkzeug.utils import secure_filename
@@ -12,6 +14,8 @@ try:
     from ..core import (
         SUPPORTED_EXTENSIONS,
         DEFAULT_QUALITY,
+        MAX_PIXELS,
+        ConversionResult,
         convert_image,
         format_bytes,
     )
@@ -24,11 +28,18 @@ except ImportError:
     from imgtowebp.core import (
         SUPPORTED_EXTENSIONS,
         DEFAULT_QUALITY,
+        MAX_PIXELS,
+        ConversionResult,
         convert_image,
         format_bytes,
     )
 
-@dataclass
+# Upper bound on concurrent encodes per upload request
+MAX_UPLOAD_WORKERS = 8
+# Upper bound on remembered resolved upload subdirectories
+MAX_CACHED_TARGET_DIRS = 256
+
+@dataclass(slots=True)
 class UploadItemResult:
     original_name: str
     status: str
@@ -63,6 +74,8 @@ def create_app(output_dir: Path) -> Flask:
         static_folder=str(web_dir / "static"),
     )
     output_dir.mkdir(parents=True, exist_ok=True)
+    # Resolved, sandbox-checked and created target directory per requested subdir
+    target_dirs: dict[Path, Path] = {}
 
     @app.get("/")
     def index() -> str:
@@ -82,19 +95,28 @@ def create_app(output_dir: Path) -> Flask:
 
         quality = max(0, min(100, quality))
 
-        results: list[UploadItemResult] = []
+        results: list[UploadItemResult | None] = []
         total_in = 0
         total_out = 0
         converted = 0
         skipped = 0
         failed = 0
 
-        target_dir = (output_dir / subdir).resolve()
-        # Security check to ensure target is within output_dir
-        if output_dir.resolve() not in target_dir.parents and target_dir != output_dir.resolve():
-            target_dir = output_dir.resolve()
-
-        target_dir.mkdir(parents=True, exist_ok=True)
+        target_dir = target_dirs.get(subdir)
+        if target_dir is None:
+            target_dir = (output_dir / subdir).resolve()
+            # Security check to ensure target is within output_dir
+            if output_dir.resolve() not in target_dir.parents and target_dir != output_dir.resolve():
+                target_dir = output_dir.resolve()
+            if len(target_dirs) >= MAX_CACHED_TARGET_DIRS:
+                # subdir is client-controlled; don't let the cache grow without bound
+                target_dirs.clear()
+            target_dir.mkdir(parents=True, exist_ok=True)
+            target_dirs[subdir] = target_dir
+
+        # Uploads sharing an output name are grouped and converted in order
+        # by a single task, so parallel workers never race on the same file.
+        pending: dict[Path, list[tuple[int, str, BinaryIO, int]]] = {}
 
         for f in files:
             if not f or not f.filename:
@@ -112,20 +134,51 @@ def create_app(output_dir: Path) -> Flask:
             stem = Path(safe_name).stem
             out_path = target_dir / f"{stem}.webp"
 
-            data = f.read()
-            if not data:
+            # Hand the upload stream straight to PIL instead of buffering a copy
+            stream = f.stream
+            input_size = stream.seek(0, os.SEEK_END)
+            stream.seek(0)
+            if not input_size:
                 skipped += 1
                 results.append(UploadItemResult(original_name, "skipped", "Empty file."))
                 continue
 
-            res = convert_image(data, out_path, quality=quality, overwrite=overwrite)
-
-            if res.success:
-                total_in += res.input_size
-                total_out += res.output_size
-                converted += 1
-                results.append(
-                    UploadItemResult(
+            pending.setdefault(out_path, []).append((len(results), original_name, stream, input_size))
+            results.append(None)
+
+        def convert_group(
+            item: tuple[Path, list[tuple[int, str, BinaryIO, int]]]
+        ) -> list[tuple[int, str, Path, ConversionResult]]:
+            out_path, uploads = item
+            return [
+                (
+                    index,
+                    original_name,
+                    out_path,
+                    convert_image(
+                        stream,
+                        out_path,
+                        quality=quality,
+                        overwrite=overwrite,
+                        input_size=input_size,
+                        max_pixels=MAX_PIXELS,
+                    ),
+                )
+                for index, original_name, stream, input_size in uploads
+            ]
+
+        # PIL releases the GIL while encoding, so threads are enough here
+        workers = min(MAX_UPLOAD_WORKERS, os.cpu_count() or 1, max(1, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            converted_groups = list(executor.map(convert_group, pending.items()))
+
+        for group in converted_groups:
+            for index, original_name, out_path, res in group:
+                if res.success:
+                    total_in += res.input_size
+                    total_out += res.output_size
+                    converted += 1
+                    results[index] = UploadItemResult(
                         original_name=original_name,
                         status="converted",
                         message="Saved.",
@@ -133,21 +186,17 @@ def create_app(output_dir: Path) -> Flask:
                         input_bytes=res.input_size,
                         output_bytes=res.output_size,
                     )
-                )
-            else:
-                if "exists" in res.message:
+                elif "exists" in res.message:
                     skipped += 1
-                    results.append(
-                        UploadItemResult(
-                            original_name=original_name,
-                            status="skipped",
-                            message=res.message,
-                            output_relpath=str(out_path.relative_to(output_dir)),
-                        )
+                    results[index] = UploadItemResult(
+                        original_name=original_name,
+                        status="skipped",
+                        message=res.message,
+                        output_relpath=str(out_path.relative_to(output_dir)),
                     )
                 else:
                     failed += 1
-                    results.append(UploadItemResult(original_name, "failed", res.message))
+                    results[index] = UploadItemResult(original_name, "failed", res.message)
 
         saved_bytes = total_in - total_out
         saved_pct = (saved_bytes / total_in * 100.0) if total_in > 0 else 0.0